@@ -0,0 +1,141 @@
+"""Long-range nutrition trends computed over NumPy arrays of a user's daily totals."""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+TREND_NUTRIENTS = [
+    "calories", "protein", "total_carbohydrates", "total_fat", "saturated_fat",
+    "trans_fat", "dietary_fiber", "total_sugars", "added_sugars", "cholesterol",
+    "sodium", "vitamin_a", "vitamin_c", "vitamin_d", "calcium", "iron", "potassium"
+]
+
+TREND_WINDOWS = [30, 90, 365]
+ROLLING_DAYS = 7
+ON_TARGET_TOLERANCE = 0.1
+
+# FDA daily values for a 2,000 kcal diet. Energy-linked macros are scaled to the
+# user's own calorie target; vitamins and minerals are used as-is.
+REFERENCE_DAILY_VALUES = {
+    "protein": 50, "total_carbohydrates": 275, "total_fat": 78, "saturated_fat": 20,
+    "dietary_fiber": 28, "added_sugars": 50, "cholesterol": 300, "sodium": 2300,
+    "vitamin_a": 900, "vitamin_c": 90, "vitamin_d": 20, "calcium": 1300,
+    "iron": 18, "potassium": 4700
+}
+CALORIE_SCALED_NUTRIENTS = {"protein", "total_carbohydrates", "total_fat", "saturated_fat", "dietary_fiber", "added_sugars"}
+
+def daily_targets(calorie_target: float) -> np.ndarray:
+    """Target per nutrient in TREND_NUTRIENTS order; NaN where there is no reference value."""
+    scale = calorie_target / 2000
+    targets = []
+    for nutrient in TREND_NUTRIENTS:
+        if nutrient == "calories":
+            targets.append(calorie_target)
+        elif nutrient in REFERENCE_DAILY_VALUES:
+            value = REFERENCE_DAILY_VALUES[nutrient]
+            targets.append(value * scale if nutrient in CALORIE_SCALED_NUTRIENTS else value)
+        else:
+            targets.append(np.nan)
+    return np.array(targets, dtype=float)
+
+def build_daily_matrix(day_index: np.ndarray, values: np.ndarray, days: int) -> tuple:
+    """Sum per-entry rows into a (days, nutrients) matrix plus a mask of days with any entry."""
+    totals = np.zeros((days, values.shape[1]))
+    np.add.at(totals, day_index, values)
+    logged = np.bincount(day_index, minlength=days) > 0
+    return totals, logged
+
+def rolling_average(totals: np.ndarray, logged: np.ndarray, window: int = ROLLING_DAYS) -> np.ndarray:
+    """Mean of the logged days inside each trailing window; NaN when the window has none."""
+    sums = np.cumsum(np.vstack([np.zeros((1, totals.shape[1])), totals]), axis=0)
+    counts = np.cumsum(np.concatenate([[0], logged.astype(int)]))
+    upper = np.arange(1, len(totals) + 1)
+    lower = np.maximum(0, upper - window)
+    window_sums = sums[upper] - sums[lower]
+    window_counts = counts[upper] - counts[lower]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return window_sums / window_counts[:, None]
+
+def trend_slopes(totals: np.ndarray, logged: np.ndarray) -> np.ndarray:
+    """Least-squares slope (units per day) for every nutrient over the logged days."""
+    x = np.flatnonzero(logged).astype(float)
+    if len(x) < 2:
+        return np.full(totals.shape[1], np.nan)
+    y = totals[logged]
+    x_centered = x - x.mean()
+    return (x_centered @ (y - y.mean(axis=0))) / (x_centered @ x_centered)
+
+def longest_and_current_run(mask: np.ndarray) -> Dict[str, int]:
+    if not mask.any():
+        return {"current": 0, "longest": 0}
+    padded = np.concatenate([[0], mask.astype(int), [0]])
+    edges = np.diff(padded)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    lengths = ends - starts
+    current = int(lengths[-1]) if ends[-1] == len(mask) else 0
+    return {"current": current, "longest": int(lengths.max())}
+
+def to_number(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+def to_json_values(values: np.ndarray) -> List[Optional[float]]:
+    return [None if np.isnan(value) else round(float(value), 2) for value in values]
+
+def to_json_dict(values: np.ndarray) -> Dict[str, Optional[float]]:
+    return dict(zip(TREND_NUTRIENTS, to_json_values(values)))
+
+def compute_trends(rows: List[Dict[str, Any]], calorie_target: float, as_of: datetime, series_days: int) -> Dict[str, Any]:
+    """Build the /trends payload from entry rows carrying a date and TREND_NUTRIENTS values."""
+    span = max(max(TREND_WINDOWS), series_days)
+    first_day = (as_of - timedelta(days=span - 1)).date()
+
+    dates = np.array([row["date"] for row in rows], dtype="datetime64[D]")
+    day_index = (dates - np.datetime64(first_day, "D")).astype(int)
+    values = np.array([[to_number(row.get(nutrient)) for nutrient in TREND_NUTRIENTS] for row in rows], dtype=float).reshape(len(rows), len(TREND_NUTRIENTS))
+    in_range = (day_index >= 0) & (day_index < span)
+    totals, logged = build_daily_matrix(day_index[in_range], values[in_range], span)
+
+    targets = daily_targets(calorie_target)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        percent_of_target = totals / targets * 100
+
+    calories = totals[:, TREND_NUTRIENTS.index("calories")]
+    on_target = logged & (np.abs(calories - calorie_target) <= calorie_target * ON_TARGET_TOLERANCE)
+
+    windows = {}
+    for window in TREND_WINDOWS:
+        window_totals = totals[-window:]
+        window_logged = logged[-window:]
+        logged_days = int(window_logged.sum())
+        with np.errstate(invalid="ignore"):
+            averages = window_totals[window_logged].mean(axis=0) if logged_days else np.full(len(TREND_NUTRIENTS), np.nan)
+            average_percent = percent_of_target[-window:][window_logged].mean(axis=0) if logged_days else np.full(len(TREND_NUTRIENTS), np.nan)
+        windows[str(window)] = {
+            "logged_days": logged_days,
+            "on_target_days": int(on_target[-window:].sum()),
+            "average": to_json_dict(averages),
+            "percent_of_target": to_json_dict(average_percent),
+            "trend_slope_per_day": to_json_dict(trend_slopes(window_totals, window_logged))
+        }
+
+    rolling = rolling_average(totals, logged)[-series_days:]
+    series_dates = [(first_day + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(span - series_days, span)]
+
+    return {
+        "as_of": as_of.strftime("%Y-%m-%d"),
+        "daily_targets": to_json_dict(targets),
+        "windows": windows,
+        "streaks": {
+            "logging": longest_and_current_run(logged),
+            "on_calorie_target": longest_and_current_run(on_target)
+        },
+        "rolling_7_day_average": {
+            "dates": series_dates,
+            **{nutrient: to_json_values(rolling[:, i]) for i, nutrient in enumerate(TREND_NUTRIENTS)}
+        }
+    }
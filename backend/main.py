@@ -1,25 +1,57 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Depends
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Depends, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, Dict, List, Any
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator, model_validator
+from typing import Optional, Dict, List, Any, Callable
 import os
 import json
 import requests
 import base64
 from datetime import datetime, timedelta
-from PIL import Image
 import io
 from dotenv import load_dotenv
 import logging
 from contextlib import asynccontextmanager
 import re
-from sqlalchemy import create_engine, Column, Integer, String, Float, Text, DateTime, JSON
+import csv
+import zlib
+import time
+import importlib.util
+import random
+import hashlib
+import hmac
+import threading
+import shutil
+from collections import OrderedDict
+from sqlalchemy import create_engine, Column, Integer, String, Float, Text, DateTime, JSON, LargeBinary, UniqueConstraint, func, null, or_
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
-# Add the required imports for Sarvam translation
 from pprint import pprint
-from imagine import ChatMessage, ImagineClient
+
+from profiler import StackSampler
+
+# PIL, pytesseract, NumPy and the Sarvam SDK are imported where they are first
+# used so that a new instance can start serving liveness checks straight away
+# pytesseract is only a wrapper; the tesseract binary has to be on the host as well
+PYTESSERACT_AVAILABLE = importlib.util.find_spec("pytesseract") is not None and shutil.which("tesseract") is not None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 load_dotenv()
 
@@ -31,6 +63,26 @@ QWEN_MODEL = os.getenv("QWEN_MODEL")
 QWEN_API_URL = os.getenv("QWEN_API_URL")
 SARVAM_API_KEY = os.getenv("SARVAM_API_KEY")
 SARVAM_ENDPOINT = os.getenv("SARVAM_ENDPOINT")
+SARVAM_RETRY_SECONDS = float(os.getenv("SARVAM_RETRY_SECONDS", "30"))
+WARMUP_RETRY_MAX_SECONDS = float(os.getenv("WARMUP_RETRY_MAX_SECONDS", "60"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.01"))
+PROFILE_SLOW_REQUEST_MS = float(os.getenv("PROFILE_SLOW_REQUEST_MS", "2000"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+LOCAL_OCR_ENABLED = os.getenv("LOCAL_OCR_ENABLED", "true").lower() == "true"
+LOCAL_OCR_MIN_CONFIDENCE = float(os.getenv("LOCAL_OCR_MIN_CONFIDENCE", "0.75"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1000"))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+WEEKLY_INSIGHTS_ENABLED = os.getenv("WEEKLY_INSIGHTS_ENABLED", "true").lower() == "true"
+NIGHTLY_JOBS_HOUR = int(os.getenv("NIGHTLY_JOBS_HOUR", "2"))
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "true").lower() == "true"
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", "0"))
 
 SUPPORTED_LANGUAGES = {
     "english": "en", "hindi": "hi", "tamil": "ta", "telugu": "te",
@@ -101,16 +153,29 @@ SCIENTIFIC_INGREDIENTS = {
     }
 }
 
-# Initialize Sarvam client globally
-try:
-    sarvam_client = ImagineClient(
-        api_key=SARVAM_API_KEY,
-        endpoint=SARVAM_ENDPOINT
-    )
-    logger.info("Sarvam client initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize Sarvam client: {e}")
-    sarvam_client = None
+# Sarvam client is created on first use and retried after SARVAM_RETRY_SECONDS if that fails
+sarvam_client = None
+sarvam_client_failed_at = float("-inf")
+sarvam_client_lock = threading.Lock()
+
+def get_sarvam_client():
+    global sarvam_client, sarvam_client_failed_at
+    if sarvam_client is not None:
+        return sarvam_client
+    
+    with sarvam_client_lock:
+        if sarvam_client is None and time.monotonic() - sarvam_client_failed_at >= SARVAM_RETRY_SECONDS:
+            try:
+                from imagine import ImagineClient
+                sarvam_client = ImagineClient(
+                    api_key=SARVAM_API_KEY,
+                    endpoint=SARVAM_ENDPOINT
+                )
+                logger.info("Sarvam client initialized successfully")
+            except Exception as e:
+                sarvam_client_failed_at = time.monotonic()
+                logger.error(f"Failed to initialize Sarvam client: {e}")
+    return sarvam_client
 
 DATABASE_URL = "sqlite:///./nutrition_tracker.db"
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
@@ -160,6 +225,41 @@ class NutritionEntryDB(Base):
     raw_nutrition_data = Column(JSON)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class NutritionPayloadArchiveDB(Base):
+    __tablename__ = "nutrition_payload_archive"
+    
+    entry_id = Column(Integer, primary_key=True)
+    codec = Column(String)
+    payload = Column(LargeBinary)
+    archived_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class UserDataVersionDB(Base):
+    __tablename__ = "user_data_versions"
+    
+    user_id = Column(String, primary_key=True)
+    version = Column(Integer, default=0)
+
+class WeeklyInsightDB(Base):
+    __tablename__ = "weekly_insights"
+    __table_args__ = (UniqueConstraint("user_id", "week_start"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(String, index=True)
+    week_start = Column(String)
+    summary = Column(JSON)
+    insight = Column(Text)
+    language = Column(String, default="english")
+    last_entry_id = Column(Integer)
+    generated_at = Column(DateTime, default=datetime.utcnow)
+
+class NightlyJobRunDB(Base):
+    """One row per job and night; whichever worker inserts it first runs the job."""
+    __tablename__ = "nightly_job_runs"
+    
+    job = Column(String, primary_key=True)
+    run_date = Column(String, primary_key=True)
+    claimed_at = Column(DateTime, default=datetime.utcnow)
+
 class UserProfile(BaseModel):
     user_id: str
     height: float
@@ -177,6 +277,48 @@ class TranslationRequest(BaseModel):
     text: str
     target_language: str
 
+class NutritionEntryImport(BaseModel):
+    date: str
+    product_name: str = "Unknown"
+    serving_size: str = "1 serving"
+    quantity: float = 1.0
+    meal_type: str = "snack"
+    calories: float = 0
+    protein: float = 0
+    total_carbohydrates: float = 0
+    total_fat: float = 0
+    saturated_fat: float = 0
+    trans_fat: float = 0
+    dietary_fiber: float = 0
+    total_sugars: float = 0
+    added_sugars: float = 0
+    cholesterol: float = 0
+    sodium: float = 0
+    vitamins: Optional[Dict[str, Any]] = None
+    minerals: Optional[Dict[str, Any]] = None
+    ingredients_list: Optional[List[Any]] = None
+    raw_nutrition_data: Optional[Dict[str, Any]] = None
+    created_at: Optional[datetime] = None
+
+    @model_validator(mode="before")
+    @classmethod
+    def drop_empty(cls, data: Any) -> Any:
+        # CSV rows carry empty cells for missing values
+        if isinstance(data, dict):
+            return {key: value for key, value in data.items() if value is not None and value != ""}
+        return data
+
+    @field_validator("vitamins", "minerals", "ingredients_list", "raw_nutrition_data", mode="before")
+    @classmethod
+    def decode_json_cell(cls, value: Any) -> Any:
+        return json.loads(value) if isinstance(value, str) else value
+
+    @field_validator("date")
+    @classmethod
+    def check_date(cls, value: str) -> str:
+        datetime.strptime(value, "%Y-%m-%d")
+        return value
+
 def get_db():
     db = SessionLocal()
     try:
@@ -184,6 +326,89 @@ def get_db():
     finally:
         db.close()
 
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson when it is installed."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+def select_fields(payload: Dict[str, Any], fields: Optional[str]) -> Dict[str, Any]:
+    """Trim a response to a comma-separated list of keys; dotted keys select nested values."""
+    if not fields:
+        return payload
+
+    selected: Dict[str, Any] = {}
+    for path in (field.strip() for field in fields.split(",")):
+        if not path:
+            continue
+        parts = path.split(".")
+        value = payload
+        for part in parts:
+            if not isinstance(value, dict) or part not in value:
+                break
+            value = value[part]
+        else:
+            target = selected
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+    return selected
+
+# Per-user data versions back the ETags of the dashboard endpoints. They are kept
+# in the database so every worker sees a write; the response cache is per process.
+response_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+cache_lock = threading.Lock()
+
+def get_user_version(db: Session, user_id: str) -> int:
+    return db.query(UserDataVersionDB.version).filter(UserDataVersionDB.user_id == user_id).scalar() or 0
+
+def bump_user_version(db: Session, user_id: str) -> None:
+    """Increment the user's data version inside the caller's transaction."""
+    db.execute(
+        sqlite_insert(UserDataVersionDB)
+        .values(user_id=user_id, version=1)
+        .on_conflict_do_update(index_elements=["user_id"], set_={"version": UserDataVersionDB.version + 1})
+    )
+
+def make_etag(user_id: str, version: int, view: str, params: tuple) -> str:
+    digest = hashlib.md5(json.dumps([user_id, view, params]).encode()).hexdigest()[:12]
+    return f'W/"{version}-{digest}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def serve_user_view(request: Request, db: Session, user_id: str, view: str, params: tuple, build: Callable[[], Dict[str, Any]]) -> Response:
+    """Serve a per-user view with an ETag, answering 304 or from cache when the user's data is unchanged."""
+    version = get_user_version(db, user_id)
+    etag = make_etag(user_id, version, view, params)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    key = (view, user_id, params)
+    with cache_lock:
+        cached = response_cache.get(key)
+        if cached and cached[0] == version:
+            response_cache.move_to_end(key)
+            return FastJSONResponse(content=cached[1], headers=headers)
+
+    payload = build()
+
+    with cache_lock:
+        response_cache[key] = (version, payload)
+        response_cache.move_to_end(key)
+        while len(response_cache) > RESPONSE_CACHE_SIZE:
+            response_cache.popitem(last=False)
+
+    return FastJSONResponse(content=payload, headers=headers)
+
 def calculate_bmi(height_cm: float, weight_kg: float) -> float:
     height_m = height_cm / 100
     return round(weight_kg / (height_m ** 2), 2)
@@ -220,6 +445,8 @@ def calculate_daily_calories(profile: UserProfileDB) -> int:
 
 def preprocess_image(image_data: bytes) -> bytes:
     try:
+        from PIL import Image
+        
         image = Image.open(io.BytesIO(image_data))
         
         if image.mode != 'RGB':
@@ -237,6 +464,201 @@ def preprocess_image(image_data: bytes) -> bytes:
         logger.error(f"Image preprocessing failed: {e}")
         return image_data
 
+# Label rows for the local OCR parser. More specific labels come first so that
+# "Saturated Fat" is not claimed by the "Fat" row, and so on.
+OCR_ROW_PATTERNS = [
+    ("saturated_fat", re.compile(r'\bsat(?:urated|\.)?\s*fat|\bsaturates\b')),
+    ("trans_fat", re.compile(r'\btrans\s*fat')),
+    ("total_fat", re.compile(r'\b(?:total\s*)?fat\b')),
+    ("added_sugars", re.compile(r'\badded\s*sugars?')),
+    ("total_sugars", re.compile(r'\b(?:total\s*)?sugars?\b')),
+    ("dietary_fiber", re.compile(r'\b(?:dietary\s*)?fib(?:er|re)\b')),
+    ("total_carbohydrates", re.compile(r'\b(?:total\s*)?carb(?:ohydrate)?s?\b|\bcarbohydrates?\b')),
+    ("protein", re.compile(r'\bprotein\b')),
+    ("cholesterol", re.compile(r'\bcholesterol\b')),
+    ("sodium", re.compile(r'\bsodium\b')),
+    ("salt", re.compile(r'\bsalt\b')),
+    ("potassium", re.compile(r'\bpotassium\b')),
+    ("calcium", re.compile(r'\bcalcium\b')),
+    ("iron", re.compile(r'\biron\b')),
+    ("vitamin_a", re.compile(r'\bvit(?:amin|\.)?\s*a\b')),
+    ("vitamin_c", re.compile(r'\bvit(?:amin|\.)?\s*c\b')),
+    ("vitamin_d", re.compile(r'\bvit(?:amin|\.)?\s*d\b')),
+    ("calories", re.compile(r'\bcalories\b|\benergy\b')),
+]
+
+# "1,160" is digit-grouped; a comma is only a decimal comma before one or two digits ("2,5g")
+OCR_VALUE_PATTERN = re.compile(r'(\d{1,3}(?:,\d{3})+(?!\d)|\d+(?:\.\d+|,\d{1,2}(?!\d))?)\s*(kcal|kj|mcg|µg|ug|mg|g|%)?')
+# Unit printed once in the row label, e.g. "Energy (kJ) 1046" or "Sodium (mg) 160"
+OCR_LABEL_UNIT_PATTERN = re.compile(r'\(\s*(kcal|kj|mcg|µg|ug|mg|g)\s*\)')
+OCR_MILLIGRAM_FIELDS = {"cholesterol", "sodium", "potassium", "calcium", "iron"}
+OCR_PER_100_PATTERN = re.compile(r'per\s*100\s*(g|ml)\b')
+OCR_HEADER_PATTERN = re.compile(r'nutrition|facts|information|serving|ingredients|per\s*100|daily\s*value|amount|typical')
+
+# A panel is only trusted when every one of these rows was read
+OCR_CORE_FIELDS = ["calories", "protein", "total_carbohydrates", "total_fat", "total_sugars", "sodium"]
+
+def ocr_image_lines(image_data: bytes) -> List[tuple]:
+    """OCR the image into (text, mean word confidence, line height) tuples in reading order."""
+    import pytesseract
+    from PIL import Image
+    
+    image = Image.open(io.BytesIO(image_data)).convert('L')
+    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+
+    lines: Dict[tuple, List[tuple]] = {}
+    for i, word in enumerate(data["text"]):
+        word = word.strip()
+        conf = float(data["conf"][i])
+        if not word or conf < 0:
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append((word, conf, data["height"][i]))
+
+    return [
+        (
+            " ".join(word for word, _, _ in words),
+            sum(conf for _, conf, _ in words) / len(words),
+            max(height for _, _, height in words)
+        )
+        for _, words in sorted(lines.items())
+    ]
+
+def normalize_ocr_value(field: str, value: float, unit: Optional[str]) -> float:
+    if field == "calories":
+        return round(value / 4.184, 1) if unit == "kj" else value
+    if field == "salt":
+        # Salt is 40% sodium; EU panels list salt in grams
+        grams = value / 1000 if unit == "mg" else value
+        return round(grams * 400, 1)
+    if field in OCR_MILLIGRAM_FIELDS:
+        return value * 1000 if unit == "g" else value
+    if field.startswith("vitamin_"):
+        return value
+    return value / 1000 if unit == "mg" else value
+
+def parse_ocr_number(raw: str) -> float:
+    if re.search(r',\d{3}$', raw):
+        return float(raw.replace(",", ""))
+    return float(raw.replace(",", "."))
+
+def read_ocr_row(lowered: str, label) -> Optional[tuple]:
+    """Amount, unit and column count for a label row, preferring kcal for energy rows.
+
+    A "Calories" row without a unit is read as kcal, as on US panels.
+    """
+    amounts = [m for m in OCR_VALUE_PATTERN.finditer(lowered) if m.group(2) != "%"]
+    if not amounts:
+        return None
+    amounts = [m for m in amounts if m.start() >= label.end()] or amounts
+    energy_row = label.group() in ("energy", "calories")
+    kcal = [m for m in amounts if m.group(2) == "kcal"]
+    # "1046kJ/250kcal" is one column; "250kcal 75kcal" or "8g 3g" are two
+    columns = amounts if not (energy_row and kcal) else kcal
+    value = columns[0]
+
+    unit = value.group(2)
+    if unit is None:
+        label_unit = OCR_LABEL_UNIT_PATTERN.search(lowered)
+        unit = label_unit.group(1) if label_unit else None
+    if unit is None and label.group() == "calories":
+        unit = "kcal"
+    return parse_ocr_number(value.group(1)), unit, len(columns)
+
+def is_product_name_candidate(lowered: str) -> bool:
+    letters = sum(char.isalpha() for char in lowered)
+    if letters < 3 or letters / max(len(lowered.replace(" ", "")), 1) < 0.6:
+        return False
+    if "%" in lowered or OCR_HEADER_PATTERN.search(lowered):
+        return False
+    return not any(pattern.search(lowered) for _, pattern in OCR_ROW_PATTERNS)
+
+def parse_nutrition_panel_text(lines: List[tuple]) -> tuple:
+    """Map OCR lines onto nutrition fields and score them.
+
+    The product name is taken from the tallest line that is not a panel row or
+    header; when only the panel is in frame it stays "Unknown Product".
+    Confidence is 0 unless every OCR_CORE_FIELDS row was read with a unit (kJ or
+    kcal for energy) and a single amount. Multi-column panels such as "per 100g |
+    per serving" are left to Qwen; a single "per 100g" column sets the serving
+    size to 100 g so quantities scale correctly.
+    """
+    nutrition_data = create_default_nutrition_data()
+    found: Dict[str, float] = {}
+    ingredients_text = None
+    name_candidates = []
+    per_100 = None
+
+    for text, conf, height in lines:
+        lowered = text.lower()
+        per_100 = per_100 or OCR_PER_100_PATTERN.search(lowered)
+
+        if ingredients_text is not None:
+            ingredients_text += " " + text
+            continue
+        if lowered.startswith("ingredients"):
+            ingredients_text = text.split(":", 1)[1] if ":" in text else text[len("ingredients"):]
+            continue
+        if lowered.startswith("serving size"):
+            nutrition_data["serving_size"] = text[len("serving size"):].strip(" :-") or "1 serving"
+            continue
+        if is_product_name_candidate(lowered):
+            name_candidates.append((height, -len(name_candidates), text.strip()))
+            continue
+
+        # "Calories 230 Calories from Fat 72": keep the part before the fat calories
+        if "from fat" in lowered:
+            lowered = lowered[:lowered.index("from fat")]
+
+        for field, label_pattern in OCR_ROW_PATTERNS:
+            label = label_pattern.search(lowered)
+            if not label:
+                continue
+            row = read_ocr_row(lowered, label)
+            target = "sodium" if field == "salt" else field
+            if row and target not in found:
+                amount, unit, columns = row
+                nutrition_data[target] = normalize_ocr_value(field, amount, unit)
+                known_unit = unit in ("kcal", "kj") if target == "calories" else unit is not None
+                found[target] = conf if known_unit and columns == 1 else 0.0
+            break
+
+    if per_100:
+        nutrition_data["serving_size"] = f"100{per_100.group(1)}"
+    if name_candidates:
+        nutrition_data["product_name"] = max(name_candidates)[2]
+    if ingredients_text:
+        nutrition_data["ingredients_list"] = [
+            item.strip(" .") for item in ingredients_text.split(",") if item.strip(" .")
+        ]
+
+    core_confidences = [found.get(field, 0.0) for field in OCR_CORE_FIELDS]
+    if min(core_confidences) == 0:
+        return nutrition_data, 0.0
+    return nutrition_data, round(sum(core_confidences) / len(core_confidences) / 100, 3)
+
+def extract_nutrition_locally(image_data: bytes) -> Optional[Dict[str, Any]]:
+    """Read a printed nutrition panel with Tesseract, skipping the vision model.
+
+    Returns None when local OCR is disabled or unavailable, or when the parsed
+    panel is below LOCAL_OCR_MIN_CONFIDENCE, so the caller falls back to Qwen.
+    If no product name is visible the result keeps "Unknown Product"; such
+    scans are not added to the product index unless the client sends a name.
+    """
+    if not LOCAL_OCR_ENABLED or not PYTESSERACT_AVAILABLE:
+        return None
+
+    try:
+        nutrition_data, confidence = parse_nutrition_panel_text(ocr_image_lines(image_data))
+    except Exception as e:
+        logger.error(f"Local OCR extraction failed: {e}")
+        return None
+
+    logger.info(f"Local OCR confidence: {confidence}")
+    if confidence < LOCAL_OCR_MIN_CONFIDENCE:
+        return None
+    return nutrition_data
+
 def extract_nutrition_from_image_with_qwen(image_data: bytes) -> Dict[str, Any]:
     try:
         b64 = base64.b64encode(image_data).decode()
@@ -311,38 +733,162 @@ Extract ALL visible values. Use 0 for missing values. Return ONLY numbers withou
         logger.error(f"Image extraction failed: {str(e)}")
         return {"error": f"Analysis failed: {str(e)}"}
 
-def clean_and_parse_json(text: str) -> Dict[str, Any]:
+NUTRIENT_FIELDS = [
+    "calories", "protein", "total_carbohydrates", "total_fat", "saturated_fat",
+    "trans_fat", "dietary_fiber", "total_sugars", "added_sugars", "cholesterol",
+    "sodium", "vitamin_a", "vitamin_c", "vitamin_d", "calcium", "iron", "potassium"
+]
+
+NUMBER_PATTERN = re.compile(r'-?\d+(?:\.\d+)?')
+# Both repairs are anchored to a quoted key so text inside string values is left alone
+UNIT_SUFFIX_PATTERN = re.compile(r'("[^"]+"\s*:\s*-?\d+(?:\.\d+)?)\s*[a-zA-Zµ%]+')
+TRAILING_COMMA_PATTERN = re.compile(r',\s*([}\]])')
+# "calories": 1,000 -- after a key a comma can only be a digit-group separator
+THOUSANDS_PATTERN = re.compile(r'("[^"]+"\s*:\s*-?\d{1,3})((?:,\d{3})+)(?!\d)')
+
+class NutritionData(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    product_name: str = "Unknown"
+    serving_size: str = "1 serving"
+    calories: float = 0
+    protein: float = 0
+    total_carbohydrates: float = 0
+    total_fat: float = 0
+    saturated_fat: float = 0
+    trans_fat: float = 0
+    dietary_fiber: float = 0
+    total_sugars: float = 0
+    added_sugars: float = 0
+    cholesterol: float = 0
+    sodium: float = 0
+    vitamin_a: float = 0
+    vitamin_c: float = 0
+    vitamin_d: float = 0
+    calcium: float = 0
+    iron: float = 0
+    potassium: float = 0
+    ingredients_list: List[str] = []
+
+    @model_validator(mode="before")
+    @classmethod
+    def drop_nulls(cls, data: Any) -> Any:
+        # Let explicit nulls from the model fall back to the field defaults
+        if isinstance(data, dict):
+            return {key: value for key, value in data.items() if value is not None}
+        return data
+
+    @field_validator(*NUTRIENT_FIELDS, mode="before")
+    @classmethod
+    def coerce_number(cls, value: Any) -> float:
+        # Quoted values or values with units left on them, e.g. "12g" or "<1"
+        if isinstance(value, bool):
+            return 0
+        if isinstance(value, (int, float)):
+            return value
+        match = NUMBER_PATTERN.search(str(value))
+        return float(match.group()) if match else 0
+
+    @field_validator("product_name", "serving_size", mode="before")
+    @classmethod
+    def coerce_text(cls, value: Any) -> str:
+        return value if isinstance(value, str) else str(value)
+
+    @field_validator("ingredients_list", mode="before")
+    @classmethod
+    def coerce_ingredients(cls, value: Any) -> List[str]:
+        if isinstance(value, str):
+            return [item.strip() for item in value.split(",") if item.strip()]
+        if not isinstance(value, list):
+            return []
+        return [str(item) for item in value]
+
+class IncrementalJSONExtractor:
+    """Pulls complete top-level JSON objects out of model output in a single pass.
+
+    Text can be fed in arbitrary chunks (e.g. a streamed completion); every
+    object whose braces balance is returned as soon as its closing brace arrives.
+    Braces inside string literals are ignored.
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> List[str]:
+        objects = []
+        for char in chunk:
+            if self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+                    self._buffer = [char]
+                continue
+
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    objects.append("".join(self._buffer))
+                    self._buffer = []
+        return objects
+
+def repair_json_text(json_str: str) -> str:
+    json_str = THOUSANDS_PATTERN.sub(lambda m: m.group(1) + m.group(2).replace(",", ""), json_str)
+    json_str = UNIT_SUFFIX_PATTERN.sub(r'\1', json_str)
+    return TRAILING_COMMA_PATTERN.sub(r'\1', json_str)
+
+def load_json_object(json_str: str) -> Optional[Dict[str, Any]]:
+    for candidate in (json_str, repair_json_text(json_str)):
+        try:
+            parsed = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(parsed, dict):
+            return parsed
+    return None
+
+def extract_json_object(text: str) -> Optional[Dict[str, Any]]:
+    for json_str in IncrementalJSONExtractor().feed(text):
+        parsed = load_json_object(json_str)
+        if parsed is not None:
+            return parsed
+    return None
+
+def validate_nutrition_data(parsed_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     try:
-        json_match = re.search(r'\{.*\}', text, re.DOTALL)
-        if not json_match:
-            return create_default_nutrition_data()
-        
-        json_str = json_match.group()
-        json_str = re.sub(r'"([^"]+)":\s*(\d+(?:\.\d+)?)\s*[a-zA-Z%]+', r'"\1": \2', json_str)
-        
-        parsed_data = json.loads(json_str)
-        
-        required_fields = [
-            "product_name", "serving_size", "calories", "protein", "total_carbohydrates",
-            "total_fat", "saturated_fat", "trans_fat", "dietary_fiber", "total_sugars",
-            "added_sugars", "cholesterol", "sodium", "vitamin_a", "vitamin_c", "vitamin_d",
-            "calcium", "iron", "potassium", "ingredients_list"
-        ]
-        
-        for field in required_fields:
-            if field not in parsed_data:
-                if field == "ingredients_list":
-                    parsed_data[field] = []
-                elif field in ["product_name", "serving_size"]:
-                    parsed_data[field] = "Unknown" if field == "product_name" else "1 serving"
-                else:
-                    parsed_data[field] = 0
-        
-        return parsed_data
-        
-    except json.JSONDecodeError as e:
-        logger.error(f"JSON parsing failed: {e}")
-        return create_default_nutrition_data()
+        return NutritionData.model_validate(parsed_data).model_dump()
+    except ValidationError as e:
+        logger.error(f"Nutrition data validation failed: {e}")
+        return None
+
+def parse_nutrition_stream(chunks) -> Dict[str, Any]:
+    extractor = IncrementalJSONExtractor()
+    for chunk in chunks:
+        for json_str in extractor.feed(chunk):
+            parsed = load_json_object(json_str)
+            if parsed is None:
+                continue
+            nutrition_data = validate_nutrition_data(parsed)
+            if nutrition_data is not None:
+                return nutrition_data
+    logger.error("No valid nutrition JSON found in model output")
+    return create_default_nutrition_data()
+
+def clean_and_parse_json(text: str) -> Dict[str, Any]:
+    return parse_nutrition_stream([text])
 
 def create_default_nutrition_data() -> Dict[str, Any]:
     return {
@@ -439,15 +985,8 @@ Focus on scientific ingredients and provide simple explanations."""
             content = response_data["choices"][0]["message"]["content"]
             logger.info(f"Nutrition analysis response: {content[:200]}...")
             
-            try:
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    analysis_data = json.loads(json_match.group())
-                    return analysis_data
-                else:
-                    return create_default_analysis()
-            except json.JSONDecodeError:
-                return create_default_analysis()
+            analysis_data = extract_json_object(content)
+            return analysis_data if analysis_data is not None else create_default_analysis()
         else:
             logger.error(f"Analysis API Error: {response.status_code}")
             return create_default_analysis()
@@ -471,7 +1010,8 @@ def translate_with_sarvam(text: str, target_language: str) -> str:
         if target_language.lower() == "english":
             return text
             
-        if sarvam_client is None:
+        client = get_sarvam_client()
+        if client is None:
             logger.error("Sarvam client not initialized")
             return text
         
@@ -483,7 +1023,9 @@ def translate_with_sarvam(text: str, target_language: str) -> str:
         prompt = f"Translate the following nutrition and health information to {target_language} language. Keep it simple and easy to understand:\n\n{text}"
         
         # Use ChatMessage and client.chat() as per your syntax
-        response = sarvam_client.chat(
+        from imagine import ChatMessage
+        
+        response = client.chat(
             messages=[
                 ChatMessage(role="user", content=prompt)
             ],
@@ -538,22 +1080,402 @@ def store_nutrition_entry(db: Session, nutrition_data: Dict[str, Any], user_id:
     )
     
     db.add(entry)
+    bump_user_version(db, user_id)
     db.commit()
     db.refresh(entry)
     return entry
 
+EXPORT_COLUMNS = [
+    "id", "date", "product_name", "serving_size", "quantity", "meal_type",
+    "calories", "protein", "total_carbohydrates", "total_fat", "saturated_fat",
+    "trans_fat", "dietary_fiber", "total_sugars", "added_sugars", "cholesterol",
+    "sodium", "vitamins", "minerals", "ingredients_list", "raw_nutrition_data", "created_at"
+]
+EXPORT_JSON_COLUMNS = {"vitamins", "minerals", "ingredients_list", "raw_nutrition_data"}
+
+# JSON payload columns that the compaction job moves out of the hot table
+ARCHIVED_JSON_COLUMNS = ["vitamins", "minerals", "ingredients_list", "raw_nutrition_data"]
+
+def compress_payload(payload: Dict[str, Any]) -> tuple:
+    data = json.dumps(payload).encode()
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(data)
+    return "zlib", zlib.compress(data, 9)
+
+def decompress_payload(codec: str, data: bytes) -> Dict[str, Any]:
+    if codec == "zstd":
+        data = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        data = zlib.decompress(data)
+    return json.loads(data)
+
+def load_archived_payloads(db: Session, entry_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    if not entry_ids:
+        return {}
+    archived = db.query(NutritionPayloadArchiveDB).filter(NutritionPayloadArchiveDB.entry_id.in_(entry_ids)).all()
+    return {row.entry_id: decompress_payload(row.codec, row.payload) for row in archived}
+
+def entry_payloads(db: Session, entries, columns: List[str] = ARCHIVED_JSON_COLUMNS) -> Dict[int, Dict[str, Any]]:
+    """JSON payload columns per entry id, read from the archive only for entries that were compacted."""
+    payloads = {}
+    compacted_ids = []
+    for entry in entries:
+        values = {column: getattr(entry, column) for column in columns}
+        if all(value is None for value in values.values()):
+            compacted_ids.append(entry.id)
+        payloads[entry.id] = values
+    for entry_id, archived in load_archived_payloads(db, compacted_ids).items():
+        payloads[entry_id] = {column: archived.get(column) for column in columns}
+    return payloads
+
+def compact_nutrition_payloads(now: Optional[datetime] = None) -> Dict[str, int]:
+    """Move JSON payloads of entries older than ARCHIVE_AFTER_DAYS into the compressed archive table."""
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=ARCHIVE_AFTER_DAYS)
+    archived = 0
+    purged = 0
+    
+    db = SessionLocal()
+    try:
+        while True:
+            batch = db.query(NutritionEntryDB).filter(
+                NutritionEntryDB.created_at < cutoff,
+                or_(*[getattr(NutritionEntryDB, column).isnot(None) for column in ARCHIVED_JSON_COLUMNS])
+            ).order_by(NutritionEntryDB.id).limit(EXPORT_BATCH_SIZE).all()
+            if not batch:
+                break
+            
+            for entry in batch:
+                codec, payload = compress_payload({column: getattr(entry, column) for column in ARCHIVED_JSON_COLUMNS})
+                db.merge(NutritionPayloadArchiveDB(entry_id=entry.id, codec=codec, payload=payload, archived_at=now))
+                for column in ARCHIVED_JSON_COLUMNS:
+                    setattr(entry, column, null())
+            db.commit()
+            archived += len(batch)
+            db.expunge_all()
+        
+        if ARCHIVE_RETENTION_DAYS > 0:
+            purged = db.query(NutritionPayloadArchiveDB).filter(
+                NutritionPayloadArchiveDB.archived_at < now - timedelta(days=ARCHIVE_RETENTION_DAYS)
+            ).delete(synchronize_session=False)
+            db.commit()
+    finally:
+        db.close()
+    
+    logger.info(f"Archived payloads of {archived} entries, purged {purged} expired archives")
+    return {"archived": archived, "purged": purged}
+
+def entry_to_export_row(entry: NutritionEntryDB, payload: Dict[str, Any]) -> Dict[str, Any]:
+    row = {column: getattr(entry, column) for column in EXPORT_COLUMNS}
+    row.update(payload)
+    row["created_at"] = entry.created_at.isoformat() if entry.created_at else None
+    return row
+
+def iter_user_entries(user_id: str):
+    """Yield (entry, JSON payloads) page by page (keyset on id) from a dedicated session."""
+    db = SessionLocal()
+    try:
+        last_id = 0
+        while True:
+            page = db.query(NutritionEntryDB).filter(
+                NutritionEntryDB.user_id == user_id,
+                NutritionEntryDB.id > last_id
+            ).order_by(NutritionEntryDB.id).limit(EXPORT_BATCH_SIZE).all()
+            if not page:
+                break
+            payloads = entry_payloads(db, page)
+            for entry in page:
+                yield entry, payloads[entry.id]
+            last_id = page[-1].id
+            db.expunge_all()
+    finally:
+        db.close()
+
+def stream_entries_ndjson(user_id: str):
+    for entry, payload in iter_user_entries(user_id):
+        yield json.dumps(entry_to_export_row(entry, payload)) + "\n"
+
+def stream_entries_csv(user_id: str):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for entry, payload in iter_user_entries(user_id):
+        row = entry_to_export_row(entry, payload)
+        for column in EXPORT_JSON_COLUMNS:
+            row[column] = json.dumps(row[column]) if row[column] is not None else ""
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def import_nutrition_rows(db: Session, user_id: str, rows) -> Dict[str, Any]:
+    """Validate rows and insert them in batches, one transaction per batch."""
+    imported = 0
+    errors = []
+    batch = []
+
+    def flush():
+        nonlocal imported
+        db.bulk_insert_mappings(NutritionEntryDB, batch)
+        bump_user_version(db, user_id)
+        db.commit()
+        imported += len(batch)
+        batch.clear()
+
+    for line_number, row in rows:
+        try:
+            # Readers yield the parse error in place of rows they could not decode
+            if isinstance(row, Exception):
+                raise row
+            if not isinstance(row, dict):
+                raise ValueError("row must be an object")
+            data = NutritionEntryImport.model_validate(row).model_dump(exclude_none=True)
+        except (ValidationError, ValueError) as e:
+            if len(errors) < 100:
+                errors.append({"line": line_number, "error": str(e)})
+            continue
+
+        data["user_id"] = user_id
+        batch.append(data)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            flush()
+
+    if batch:
+        flush()
+
+    return {"imported": imported, "rejected": len(errors), "errors": errors}
+
+def iter_ndjson_rows(lines):
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, ValueError(f"invalid JSON: {e}")
+
+def iter_csv_rows(lines):
+    for line_number, row in enumerate(csv.DictReader(lines), start=2):
+        row.pop("id", None)
+        yield line_number, row
+
+def generate_weekly_insight_with_qwen(summary: Dict[str, Any], user_profile: UserProfileDB) -> Optional[str]:
+    try:
+        insight_prompt = f"""Write a short weekly nutrition insight (3-4 sentences) for this user.
+
+WEEK SUMMARY: {json.dumps(summary, indent=2)}
+
+USER PROFILE:
+- Age: {user_profile.age}, Gender: {user_profile.gender}
+- Goal: {user_profile.goal}
+- Health conditions: {user_profile.health_conditions}
+
+Mention how the week compared with the daily target and give one practical suggestion for next week. Return plain text only."""
+
+        payload = {
+            "model": QWEN_MODEL,
+            "messages": [{"role": "user", "content": insight_prompt}],
+            "max_tokens": 400,
+            "temperature": 0.3
+        }
+        
+        response = requests.post(
+            QWEN_API_URL,
+            headers={
+                "Authorization": f"Bearer {HUGGINGFACE_TOKEN}",
+                "Content-Type": "application/json"
+            },
+            json=payload,
+            timeout=60,
+        )
+        
+        if response.status_code == 200:
+            return response.json()["choices"][0]["message"]["content"].strip()
+        logger.error(f"Weekly insight API Error: {response.status_code}")
+        return None
+        
+    except Exception as e:
+        logger.error(f"Weekly insight generation failed: {str(e)}")
+        return None
+
+def precompute_user_weekly_insight(db: Session, user_id: str, start: datetime, week_start: str) -> bool:
+    user_profile = db.query(UserProfileDB).filter(UserProfileDB.user_id == user_id).first()
+    if not user_profile:
+        return False
+    
+    built_through_id = last_entry_id(db, user_id)
+    summary = build_weekly_summary(user_id, start, db)
+    insight = generate_weekly_insight_with_qwen(summary, user_profile)
+    if insight is None:
+        return False
+    
+    language = user_profile.preferred_language if user_profile.preferred_language in SUPPORTED_LANGUAGES else "english"
+    if language != "english":
+        insight = translate_with_sarvam(insight, language)
+    
+    stored = db.query(WeeklyInsightDB).filter(
+        WeeklyInsightDB.user_id == user_id,
+        WeeklyInsightDB.week_start == week_start
+    ).first() or WeeklyInsightDB(user_id=user_id, week_start=week_start)
+    stored.summary = summary
+    stored.insight = insight
+    stored.language = language
+    stored.last_entry_id = built_through_id
+    stored.generated_at = datetime.utcnow()
+    db.add(stored)
+    bump_user_version(db, user_id)
+    db.commit()
+    return True
+
+def precompute_weekly_insights(now: Optional[datetime] = None) -> int:
+    """Store weekly aggregates and a translated insight for every user who logged food this week."""
+    now = now or datetime.now()
+    start = now - timedelta(days=6)
+    week_start = start.strftime("%Y-%m-%d")
+    generated = 0
+    
+    db = SessionLocal()
+    try:
+        active_user_ids = [row.user_id for row in db.query(NutritionEntryDB.user_id).filter(
+            NutritionEntryDB.date >= week_start
+        ).distinct()]
+        
+        for user_id in active_user_ids:
+            try:
+                if precompute_user_weekly_insight(db, user_id, start, week_start):
+                    generated += 1
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Weekly insight for user {user_id} failed: {e}")
+    finally:
+        db.close()
+    
+    logger.info(f"Precomputed weekly insights for {generated} users (week starting {week_start})")
+    return generated
+
+def seconds_until_next_run(now: datetime, hour: int) -> float:
+    next_run = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+def claim_nightly_job(job: str, run_date: str) -> bool:
+    """True only in the one process that claims this run; other uvicorn workers skip it."""
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            sqlite_insert(NightlyJobRunDB)
+            .values(job=job, run_date=run_date, claimed_at=datetime.utcnow())
+            .on_conflict_do_nothing(index_elements=["job", "run_date"])
+        )
+        db.commit()
+        return result.rowcount == 1
+    finally:
+        db.close()
+
+def run_nightly_scheduler(stop_event: threading.Event) -> None:
+    while not stop_event.wait(seconds_until_next_run(datetime.now(), NIGHTLY_JOBS_HOUR)):
+        run_date = datetime.now().strftime("%Y-%m-%d")
+        if WEEKLY_INSIGHTS_ENABLED:
+            try:
+                if claim_nightly_job("weekly_insights", run_date):
+                    precompute_weekly_insights()
+            except Exception as e:
+                logger.error(f"Weekly insights job failed: {e}")
+        if ARCHIVE_ENABLED:
+            try:
+                if claim_nightly_job("payload_compaction", run_date):
+                    compact_nutrition_payloads()
+            except Exception as e:
+                logger.error(f"Payload compaction job failed: {e}")
+
+product_index = None
+
+def entry_per_serving(entry) -> Dict[str, float]:
+    from product_index import INDEX_FEATURES
+    
+    quantity = entry.quantity or 1.0
+    return {feature: (getattr(entry, feature) or 0) / quantity for feature in INDEX_FEATURES}
+
+def load_product_index(db: Session) -> None:
+    global product_index
+    from product_index import INDEX_FEATURES, ProductIndex
+    
+    # Published before loading so extractions made meanwhile are indexed too
+    product_index = ProductIndex()
+    columns = [getattr(NutritionEntryDB, feature) for feature in INDEX_FEATURES]
+    entries = db.query(
+        NutritionEntryDB.product_name, NutritionEntryDB.quantity, *columns
+    ).order_by(NutritionEntryDB.id).yield_per(EXPORT_BATCH_SIZE)
+    for entry in entries:
+        product_index.add(entry.product_name, entry_per_serving(entry))
+    logger.info(f"Product index loaded with {len(product_index)} products")
+
+PROCESS_STARTED_AT = time.monotonic()
+warmup_state: Dict[str, Any] = {
+    "product_index": False,
+    "sarvam_client": False,
+    "ready": False,
+    "warmup_seconds": None,
+    "attempts": 0,
+    "error": None
+}
+
+def warm_up() -> None:
+    """Build the product index and connect Sarvam off the startup path.
+    
+    A failed index load is retried with exponential backoff (capped at
+    WARMUP_RETRY_MAX_SECONDS) so a database that is briefly unavailable at boot
+    does not leave the instance unready for good.
+    """
+    delay = 1.0
+    while True:
+        warmup_state["attempts"] += 1
+        try:
+            db = SessionLocal()
+            try:
+                load_product_index(db)
+            finally:
+                db.close()
+            break
+        except Exception as e:
+            warmup_state["error"] = str(e)
+            logger.error(f"Warm-up attempt {warmup_state['attempts']} failed, retrying in {delay:.0f}s: {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, WARMUP_RETRY_MAX_SECONDS)
+    
+    warmup_state["product_index"] = True
+    warmup_state["ready"] = True
+    warmup_state["error"] = None
+    warmup_state["warmup_seconds"] = round(time.monotonic() - PROCESS_STARTED_AT, 3)
+    logger.info(f"Warm-up finished in {warmup_state['warmup_seconds']}s")
+    
+    # Translation degrades to English without Sarvam, so it does not gate readiness
+    warmup_state["sarvam_client"] = get_sarvam_client() is not None
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Every route needs the schema; create_all only issues existence checks once it is in place
     Base.metadata.create_all(bind=engine)
+    threading.Thread(target=warm_up, daemon=True, name="warm-up").start()
+    
+    scheduler_stop = threading.Event()
+    if WEEKLY_INSIGHTS_ENABLED or ARCHIVE_ENABLED:
+        threading.Thread(target=run_nightly_scheduler, args=(scheduler_stop,), daemon=True, name="nightly-jobs").start()
+    
     logger.info("Starting Comprehensive Nutrition Tracker API with SQL Database")
     yield
+    scheduler_stop.set()
     logger.info("Shutting down Comprehensive Nutrition Tracker API")
 
 app = FastAPI(
     title="Comprehensive Nutrition Tracker API",
     version="3.0.0",
     description="AI-powered nutrition analysis with SQL database, Qwen image extraction, and Sarvam translation",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 app.add_middleware(
@@ -564,6 +1486,74 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if BrotliMiddleware is not None:
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESSION_MIN_SIZE, gzip_fallback=True)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+
+stack_sampler = StackSampler(PROFILE_INTERVAL_MS / 1000)
+PROFILE_NAME_PATTERN = re.compile(r'^[\w.-]+\.folded$')
+
+def save_profile(request: Request, capture, elapsed_ms: float, reason: str) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path_slug = re.sub(r'[^\w]+', '_', request.url.path).strip("_") or "root"
+    name = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}_{request.method}_{path_slug}_{int(elapsed_ms)}ms_{reason}.folded"
+    with open(os.path.join(PROFILE_DIR, name), "w") as f:
+        f.write(capture.to_folded())
+    
+    profiles = sorted(entry for entry in os.listdir(PROFILE_DIR) if entry.endswith(".folded"))
+    for old in profiles[:max(0, len(profiles) - PROFILE_MAX_FILES)]:
+        os.remove(os.path.join(PROFILE_DIR, old))
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """Sample stacks for a random PROFILE_SAMPLE_RATE of requests and keep any slower than PROFILE_SLOW_REQUEST_MS."""
+    if not PROFILING_ENABLED or request.url.path.startswith("/admin/profiles"):
+        return await call_next(request)
+    
+    sampled = random.random() < PROFILE_SAMPLE_RATE
+    capture = stack_sampler.start_capture()
+    started = time.perf_counter()
+    try:
+        return await call_next(request)
+    finally:
+        stack_sampler.stop_capture(capture)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        slow = elapsed_ms >= PROFILE_SLOW_REQUEST_MS
+        if (sampled or slow) and capture.samples:
+            try:
+                save_profile(request, capture, elapsed_ms, "slow" if slow else "sampled")
+            except OSError as e:
+                logger.error(f"Failed to save profile: {e}")
+
+def require_admin(request: Request) -> None:
+    supplied = request.headers.get("x-admin-token", "")
+    if not ADMIN_TOKEN or not hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.get("/admin/profiles")
+async def list_profiles(_: None = Depends(require_admin)):
+    if not os.path.isdir(PROFILE_DIR):
+        return {"profiles": []}
+    
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if PROFILE_NAME_PATTERN.match(name):
+            stat = os.stat(os.path.join(PROFILE_DIR, name))
+            profiles.append({
+                "name": name,
+                "size_bytes": stat.st_size,
+                "created_at": datetime.fromtimestamp(stat.st_mtime).isoformat()
+            })
+    return {"profiles": profiles}
+
+@app.get("/admin/profiles/{name}")
+async def download_profile(name: str, _: None = Depends(require_admin)):
+    path = os.path.join(PROFILE_DIR, name)
+    if not PROFILE_NAME_PATTERN.match(name) or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=name)
+
 @app.get("/")
 async def root():
     return {
@@ -611,6 +1601,7 @@ async def register_user(profile: UserProfile, db: Session = Depends(get_db)):
     )
     
     db.add(db_profile)
+    bump_user_version(db, profile.user_id)
     db.commit()
     db.refresh(db_profile)
     
@@ -627,7 +1618,10 @@ async def register_user(profile: UserProfile, db: Session = Depends(get_db)):
     }
 
 @app.get("/user/{user_id}")
-async def get_user_profile(user_id: str, db: Session = Depends(get_db)):
+async def get_user_profile(user_id: str, request: Request, db: Session = Depends(get_db)):
+    return serve_user_view(request, db, user_id, "profile", (), lambda: build_user_profile(user_id, db))
+
+def build_user_profile(user_id: str, db: Session) -> Dict[str, Any]:
     profile = db.query(UserProfileDB).filter(UserProfileDB.user_id == user_id).first()
     if not profile:
         raise HTTPException(status_code=404, detail="User not found")
@@ -660,6 +1654,8 @@ async def analyze_nutrition_label(
     quantity: float = Form(1.0),
     meal_type: str = Form("snack"),
     preferred_language: str = Form("english"),
+    product_name: str = Form(""),
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     if not file.content_type.startswith('image/'):
@@ -672,12 +1668,21 @@ async def analyze_nutrition_label(
             raise HTTPException(status_code=400, detail="Image too large (max 10MB)")
         
         processed_image_data = preprocess_image(image_data)
-        nutrition_data = extract_nutrition_from_image_with_qwen(processed_image_data)
+        nutrition_data = extract_nutrition_locally(processed_image_data)
+        if nutrition_data is None:
+            nutrition_data = extract_nutrition_from_image_with_qwen(processed_image_data)
         
         if "error" in nutrition_data:
             logger.error(f"Nutrition extraction error: {nutrition_data['error']}")
             nutrition_data = create_default_nutrition_data()
         
+        # Panels read locally often carry no product name; let the client supply it
+        if product_name and str(nutrition_data.get("product_name", "")).lower().startswith("unknown"):
+            nutrition_data["product_name"] = product_name
+        
+        if product_index is not None:
+            product_index.add(nutrition_data.get("product_name"), nutrition_data)
+        
         user_profile = None
         language_to_use = preferred_language
         
@@ -743,7 +1748,7 @@ DAILY INTAKE ANALYSIS:
                 translated_recommendations.append(translate_with_sarvam(rec, language_to_use))
             health_analysis['recommendations'] = translated_recommendations
         
-        return {
+        return select_fields({
             "success": True,
             "extracted_nutrition": nutrition_data,
             "quantity": quantity,
@@ -751,11 +1756,14 @@ DAILY INTAKE ANALYSIS:
             "comprehensive_summary": comprehensive_summary,
             "ingredient_explanation": ingredient_explanation,
             "language_used": language_to_use,
+            "healthier_alternatives": product_index.healthier_alternatives(
+                nutrition_data.get("product_name", ""), nutrition_data, limit=3
+            ) if product_index is not None else [],
             "user_context": {
                 "bmi": calculate_bmi(user_profile.height, user_profile.weight) if user_profile else None,
                 "daily_calorie_target": calculate_daily_calories(user_profile) if user_profile else None
             }
-        }
+        }, fields)
         
     except HTTPException:
         raise
@@ -764,13 +1772,15 @@ DAILY INTAKE ANALYSIS:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 @app.get("/daily-intake/{user_id}")
-async def get_daily_intake(user_id: str, date: Optional[str] = None, db: Session = Depends(get_db)):
+async def get_daily_intake(user_id: str, request: Request, date: Optional[str] = None, db: Session = Depends(get_db)):
+    target_date = date or datetime.now().strftime("%Y-%m-%d")
+    return serve_user_view(request, db, user_id, "daily", (target_date,), lambda: build_daily_intake(user_id, target_date, db))
+
+def build_daily_intake(user_id: str, target_date: str, db: Session) -> Dict[str, Any]:
     user_profile = db.query(UserProfileDB).filter(UserProfileDB.user_id == user_id).first()
     if not user_profile:
         raise HTTPException(status_code=404, detail="User not found")
     
-    target_date = date or datetime.now().strftime("%Y-%m-%d")
-    
     daily_entries = db.query(NutritionEntryDB).filter(
         NutritionEntryDB.user_id == user_id,
         NutritionEntryDB.date == target_date
@@ -805,16 +1815,45 @@ async def get_daily_intake(user_id: str, date: Optional[str] = None, db: Session
     }
 
 @app.get("/weekly-summary/{user_id}")
-async def get_weekly_summary(user_id: str, start_date: Optional[str] = None, db: Session = Depends(get_db)):
-    user_profile = db.query(UserProfileDB).filter(UserProfileDB.user_id == user_id).first()
-    if not user_profile:
-        raise HTTPException(status_code=404, detail="User not found")
-    
+async def get_weekly_summary(user_id: str, request: Request, start_date: Optional[str] = None, db: Session = Depends(get_db)):
     if start_date:
         start = datetime.strptime(start_date, "%Y-%m-%d")
     else:
         start = datetime.now() - timedelta(days=6)
     
+    start_key = start.strftime("%Y-%m-%d")
+    return serve_user_view(request, db, user_id, "weekly", (start_key,), lambda: build_weekly_view(user_id, start, db))
+
+def last_entry_id(db: Session, user_id: str) -> Optional[int]:
+    return db.query(func.max(NutritionEntryDB.id)).filter(NutritionEntryDB.user_id == user_id).scalar()
+
+def build_weekly_view(user_id: str, start: datetime, db: Session) -> Dict[str, Any]:
+    stored = db.query(WeeklyInsightDB).filter(
+        WeeklyInsightDB.user_id == user_id,
+        WeeklyInsightDB.week_start == start.strftime("%Y-%m-%d")
+    ).first()
+    
+    if stored:
+        # Precomputed aggregates are only reused if no entry was added after they were built.
+        # Entry ids only grow, unlike created_at which /import accepts from the client.
+        fresh = last_entry_id(db, user_id) == stored.last_entry_id
+        summary = stored.summary if fresh else build_weekly_summary(user_id, start, db)
+        return {
+            **summary,
+            "insight": {
+                "text": stored.insight,
+                "language": stored.language,
+                "generated_at": stored.generated_at.isoformat()
+            }
+        }
+    
+    return {**build_weekly_summary(user_id, start, db), "insight": None}
+
+def build_weekly_summary(user_id: str, start: datetime, db: Session) -> Dict[str, Any]:
+    user_profile = db.query(UserProfileDB).filter(UserProfileDB.user_id == user_id).first()
+    if not user_profile:
+        raise HTTPException(status_code=404, detail="User not found")
+    
     weekly_data = []
     for i in range(7):
         current_date = (start + timedelta(days=i)).strftime("%Y-%m-%d")
@@ -848,9 +1887,116 @@ async def get_weekly_summary(user_id: str, start_date: Optional[str] = None, db:
         "weekly_target": daily_target * 7
     }
 
+def build_trends(user_id: str, as_of: datetime, days: int, db: Session) -> Dict[str, Any]:
+    from analytics import TREND_NUTRIENTS, TREND_WINDOWS, compute_trends, to_number
+    
+    user_profile = db.query(UserProfileDB).filter(UserProfileDB.user_id == user_id).first()
+    if not user_profile:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    first_day = (as_of - timedelta(days=max(max(TREND_WINDOWS), days) - 1)).strftime("%Y-%m-%d")
+    entries = db.query(
+        NutritionEntryDB.id, NutritionEntryDB.date, NutritionEntryDB.quantity, NutritionEntryDB.calories, NutritionEntryDB.protein,
+        NutritionEntryDB.total_carbohydrates, NutritionEntryDB.total_fat, NutritionEntryDB.saturated_fat,
+        NutritionEntryDB.trans_fat, NutritionEntryDB.dietary_fiber, NutritionEntryDB.total_sugars,
+        NutritionEntryDB.added_sugars, NutritionEntryDB.cholesterol, NutritionEntryDB.sodium,
+        NutritionEntryDB.vitamins, NutritionEntryDB.minerals
+    ).filter(
+        NutritionEntryDB.user_id == user_id,
+        NutritionEntryDB.date >= first_day,
+        NutritionEntryDB.date <= as_of.strftime("%Y-%m-%d")
+    ).all()
+    
+    payloads = entry_payloads(db, entries, ["vitamins", "minerals"])
+    rows = []
+    for entry in entries:
+        row = {nutrient: getattr(entry, nutrient) for nutrient in TREND_NUTRIENTS if nutrient in entry._fields}
+        # Macros are stored multiplied by quantity; vitamins and minerals per serving
+        quantity = entry.quantity if entry.quantity is not None else 1.0
+        for group in ("vitamins", "minerals"):
+            for nutrient, value in (payloads[entry.id].get(group) or {}).items():
+                row[nutrient] = to_number(value) * quantity
+        row["date"] = entry.date
+        rows.append(row)
+    
+    trends = compute_trends(rows, calculate_daily_calories(user_profile), as_of, days)
+    return {"user_id": user_id, **trends}
+
+@app.get("/trends/{user_id}")
+async def get_trends(user_id: str, request: Request, days: int = 90, end_date: Optional[str] = None, db: Session = Depends(get_db)):
+    if days < 1 or days > 365:
+        raise HTTPException(status_code=400, detail="days must be between 1 and 365")
+    
+    try:
+        as_of = datetime.strptime(end_date, "%Y-%m-%d") if end_date else datetime.now()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="end_date must be YYYY-MM-DD")
+    as_of_key = as_of.strftime("%Y-%m-%d")
+    return serve_user_view(request, db, user_id, "trends", (as_of_key, days), lambda: build_trends(user_id, as_of, days, db))
+
+@app.get("/alternatives/{entry_id}")
+async def get_healthier_alternatives(entry_id: int, limit: int = 5, min_similarity: float = 0.7, db: Session = Depends(get_db)):
+    if not warmup_state["product_index"]:
+        raise HTTPException(status_code=503, detail="Product index is still loading")
+    
+    entry = db.query(NutritionEntryDB).filter(NutritionEntryDB.id == entry_id).first()
+    if not entry:
+        raise HTTPException(status_code=404, detail="Entry not found")
+    
+    alternatives = product_index.healthier_alternatives(
+        entry.product_name or "", entry_per_serving(entry), limit=min(max(limit, 1), 50), min_similarity=min_similarity
+    )
+    return {
+        "entry_id": entry_id,
+        "product_name": entry.product_name,
+        "indexed_products": len(product_index),
+        "alternatives": alternatives
+    }
+
+@app.get("/export/{user_id}")
+async def export_nutrition_history(user_id: str, format: str = "ndjson", db: Session = Depends(get_db)):
+    if not db.query(UserProfileDB).filter(UserProfileDB.user_id == user_id).first():
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    if format == "ndjson":
+        return StreamingResponse(stream_entries_ndjson(user_id), media_type="application/x-ndjson")
+    if format == "csv":
+        return StreamingResponse(
+            stream_entries_csv(user_id),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{user_id}_nutrition.csv"'}
+        )
+    raise HTTPException(status_code=400, detail="Format must be 'ndjson' or 'csv'")
+
+# Plain def so FastAPI runs the line-by-line read and batch commits in the threadpool
+@app.post("/import/{user_id}")
+def import_nutrition_history(
+    user_id: str,
+    file: UploadFile = File(...),
+    format: str = Form("ndjson"),
+    db: Session = Depends(get_db)
+):
+    if not db.query(UserProfileDB).filter(UserProfileDB.user_id == user_id).first():
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="Format must be 'ndjson' or 'csv'")
+    
+    lines = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    rows = iter_ndjson_rows(lines) if format == "ndjson" else iter_csv_rows(lines)
+    
+    try:
+        result = import_nutrition_rows(db, user_id, rows)
+    except UnicodeDecodeError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="File must be UTF-8 encoded")
+    
+    logger.info(f"Imported {result['imported']} entries for {user_id} ({result['rejected']} rejected)")
+    return {"success": True, "user_id": user_id, **result}
+
 # FIXED: Translation endpoint to handle JSON body properly
 @app.post("/translate")
-async def translate_text(request: TranslationRequest):
+async def translate_text(request: TranslationRequest, fields: Optional[str] = None):
     """
     Translate text to target language using Sarvam API
     
@@ -859,6 +2005,8 @@ async def translate_text(request: TranslationRequest):
         "text": "text to translate",
         "target_language": "target language code"
     }
+    
+    Pass ?fields=translated_text to skip echoing the original text back.
     """
     if request.target_language not in SUPPORTED_LANGUAGES:
         raise HTTPException(status_code=400, detail=f"Language {request.target_language} not supported")
@@ -874,12 +2022,12 @@ async def translate_text(request: TranslationRequest):
         logger.info(f"✅ Translation completed successfully")
         logger.info(f"📝 Translated length: {len(translated)} characters")
         
-        return {
+        return select_fields({
             "original_text": request.text,
             "translated_text": translated,
             "target_language": request.target_language,
             "source_language": "english"
-        }
+        }, fields)
     except Exception as e:
         logger.error(f"❌ Translation failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Translation failed: {str(e)}")
@@ -892,11 +2040,23 @@ async def health_check():
         "database": "SQLite connected",
         "services": {
             "qwen_model": QWEN_MODEL,
+            "local_ocr": "available" if LOCAL_OCR_ENABLED and PYTESSERACT_AVAILABLE else "unavailable",
             "sarvam_translation": "available" if sarvam_client else "unavailable"
         },
         "supported_languages": list(SUPPORTED_LANGUAGES.keys())
     }
 
+@app.get("/live")
+async def liveness_check():
+    return {"status": "alive", "uptime_seconds": round(time.monotonic() - PROCESS_STARTED_AT, 3)}
+
+@app.get("/ready")
+async def readiness_check():
+    return JSONResponse(
+        status_code=200 if warmup_state["ready"] else 503,
+        content={"status": "ready" if warmup_state["ready"] else "warming_up", **warmup_state}
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
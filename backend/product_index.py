@@ -0,0 +1,125 @@
+"""In-memory nearest-neighbour index over per-serving nutrient vectors of extracted products."""
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+INDEX_FEATURES = [
+    "calories", "total_sugars", "sodium", "saturated_fat",
+    "total_fat", "total_carbohydrates", "protein", "dietary_fiber"
+]
+
+# Per-serving daily-value fractions put grams and milligrams on one scale
+FEATURE_DAILY_VALUES = np.array([2000, 50, 2300, 20, 78, 275, 50, 28], dtype=float)
+
+# Nutrients to limit count against a product, nutrients to encourage count for it
+HEALTH_WEIGHTS = np.array([1.0, 1.0, 1.0, 1.0, 0.0, 0.0, -1.0, -1.0])
+
+class ProductIndex:
+    """Cosine-similarity index whose matrix grows in place as new products are extracted.
+
+    Each product name keeps a single row (the latest extraction); rows hold the
+    L2-normalised daily-value profile so a dot product gives cosine similarity.
+    """
+
+    def __init__(self, initial_capacity: int = 256):
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((initial_capacity, len(INDEX_FEATURES)))
+        self._unit_vectors = np.zeros((initial_capacity, len(INDEX_FEATURES)))
+        self._scores = np.zeros(initial_capacity)
+        self._names: List[str] = []
+        self._rows: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    @staticmethod
+    def product_key(product_name: str) -> str:
+        return " ".join(product_name.lower().split())
+
+    @staticmethod
+    def health_score(profile: np.ndarray) -> float:
+        """Lower is better: limit nutrients add, fibre and protein subtract (in daily-value units)."""
+        return float(profile @ HEALTH_WEIGHTS)
+
+    @staticmethod
+    def to_vector(nutrition: Dict[str, Any]) -> np.ndarray:
+        vector = []
+        for feature in INDEX_FEATURES:
+            try:
+                vector.append(max(float(nutrition.get(feature) or 0), 0.0))
+            except (TypeError, ValueError):
+                vector.append(0.0)
+        return np.array(vector)
+
+    def add(self, product_name: Optional[str], nutrition: Dict[str, Any]) -> bool:
+        if not product_name or product_name.lower().startswith("unknown"):
+            return False
+        vector = self.to_vector(nutrition)
+        if not vector.any():
+            return False
+
+        profile = vector / FEATURE_DAILY_VALUES
+        unit = profile / np.linalg.norm(profile)
+        key = self.product_key(product_name)
+
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                row = len(self._names)
+                if row == len(self._vectors):
+                    self._grow()
+                self._rows[key] = row
+                self._names.append(product_name)
+            else:
+                self._names[row] = product_name
+            self._vectors[row] = vector
+            self._unit_vectors[row] = unit
+            self._scores[row] = self.health_score(profile)
+        return True
+
+    def _grow(self) -> None:
+        capacity = len(self._vectors) * 2
+        for attr in ("_vectors", "_unit_vectors"):
+            grown = np.zeros((capacity, len(INDEX_FEATURES)))
+            grown[:len(self._names)] = getattr(self, attr)[:len(self._names)]
+            setattr(self, attr, grown)
+        scores = np.zeros(capacity)
+        scores[:len(self._names)] = self._scores[:len(self._names)]
+        self._scores = scores
+
+    def healthier_alternatives(self, product_name: str, nutrition: Dict[str, Any], limit: int = 5, min_similarity: float = 0.7) -> List[Dict[str, Any]]:
+        """Most similar indexed products whose health score beats the given product's."""
+        vector = self.to_vector(nutrition)
+        if not vector.any():
+            return []
+        profile = vector / FEATURE_DAILY_VALUES
+        unit = profile / np.linalg.norm(profile)
+        score = self.health_score(profile)
+        own_key = self.product_key(product_name or "")
+
+        with self._lock:
+            count = len(self._names)
+            similarities = self._unit_vectors[:count] @ unit
+            scores = self._scores[:count].copy()
+            vectors = self._vectors[:count].copy()
+            names = list(self._names)
+            own_row = self._rows.get(own_key)
+
+        candidates = (similarities >= min_similarity) & (scores < score)
+        if own_row is not None:
+            candidates[own_row] = False
+
+        rows = np.flatnonzero(candidates)
+        rows = rows[np.argsort(-similarities[rows])][:limit]
+
+        return [
+            {
+                "product_name": names[row],
+                "similarity": round(float(similarities[row]), 3),
+                "health_score": round(float(scores[row]), 3),
+                "health_score_improvement": round(score - float(scores[row]), 3),
+                "nutrition_per_serving": dict(zip(INDEX_FEATURES, (round(float(v), 2) for v in vectors[row])))
+            }
+            for row in rows
+        ]
@@ -0,0 +1,84 @@
+"""Low-overhead stack sampler producing flamegraph-ready folded stacks."""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+MAX_STACK_DEPTH = 128
+
+class ProfileCapture:
+    """Folded-stack counts collected for one thread while a request is in flight."""
+
+    def __init__(self, thread_id: int):
+        self.thread_id = thread_id
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+    def to_folded(self) -> str:
+        """Brendan Gregg's collapsed format, readable by flamegraph.pl, speedscope and inferno."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+class StackSampler:
+    """Single background thread sampling sys._current_frames() for every active capture.
+
+    The thread only runs while at least one capture is active. Requests served by
+    the same event-loop thread share its stacks, so concurrent captures on that
+    thread see each other's frames. Only the capturing thread is sampled, so work
+    a request hands off to a threadpool worker is not recorded.
+    """
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._captures: Dict[int, ProfileCapture] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+
+    def start_capture(self) -> ProfileCapture:
+        capture = ProfileCapture(threading.get_ident())
+        with self._lock:
+            self._captures[id(capture)] = capture
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True, name="stack-sampler")
+                self._thread.start()
+            self._wakeup.notify()
+        return capture
+
+    def stop_capture(self, capture: ProfileCapture) -> ProfileCapture:
+        with self._lock:
+            self._captures.pop(id(capture), None)
+        return capture
+
+    @staticmethod
+    def fold(frame) -> str:
+        names = []
+        while frame is not None and len(names) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _run(self) -> None:
+        sampler_id = threading.get_ident()
+        while True:
+            with self._lock:
+                while not self._captures:
+                    if not self._wakeup.wait(timeout=5):
+                        self._thread = None
+                        return
+                captures = list(self._captures.values())
+
+            frames = sys._current_frames()
+            folded: Dict[int, str] = {}
+            for capture in captures:
+                if capture.thread_id == sampler_id or capture.thread_id not in frames:
+                    continue
+                if capture.thread_id not in folded:
+                    folded[capture.thread_id] = self.fold(frames[capture.thread_id])
+                capture.stacks[folded[capture.thread_id]] += 1
+                capture.samples += 1
+            del frames
+
+            time.sleep(self.interval_seconds)
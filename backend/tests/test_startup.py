@@ -0,0 +1,33 @@
+"""Guards the lazy-import startup path: importing main must stay light and fast."""
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_BUDGET_SECONDS = float(os.getenv("STARTUP_IMPORT_BUDGET_SECONDS", "5"))
+HEAVY_MODULES = ["PIL", "numpy", "imagine"]
+
+IMPORT_SCRIPT = f"""
+import json, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+def import_main() -> dict:
+    # A fresh interpreter so modules already imported by pytest do not hide regressions
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_import_does_not_load_heavy_modules():
+    assert import_main()["loaded"] == []
+
+def test_import_within_budget():
+    seconds = import_main()["seconds"]
+    assert seconds < IMPORT_BUDGET_SECONDS, f"import main took {seconds:.2f}s (budget {IMPORT_BUDGET_SECONDS}s)"